@@ -0,0 +1,54 @@
+import io
+import wave
+
+import numpy as np
+from scipy.signal import resample
+
+# Format des Azure Push-Streams und von Eagle: 16 kHz, mono, 16-bit
+PCM_SAMPLE_RATE = 16000
+PCM_CHANNELS = 1
+PCM_SAMPLE_WIDTH = 2
+
+
+def convert_wav_bytes_to_pcm(wav_bytes, target_sample_rate=PCM_SAMPLE_RATE, expected_sample_rate=None,
+                             expected_channels=None):
+    """
+    Konvertiert rohe WAV-Bytes in PCM-Format für Eagle.
+
+    - Extrahiert PCM-Daten aus WAV
+    - Prüft, dass die WAV-Datei 16-bit Samples und das angekündigte Format hat
+    - Falls nötig, wird von 8000 Hz auf 16000 Hz hochskaliert
+    - Gibt 16-bit PCM-Daten als numpy-Array zurück
+
+    :param wav_bytes: WAV-Datei als Bytes
+    :param target_sample_rate: Ziel-Sample-Rate für Eagle (Standard: 16000 Hz)
+    :param expected_sample_rate: erwartete Sample-Rate im WAV-Header, None für beliebig
+    :param expected_channels: erwartete Anzahl Kanäle im WAV-Header, None für beliebig
+    :return: PCM-Daten als numpy-Array (int16)
+    :raises ValueError: wenn die WAV-Datei ungültig ist oder nicht dem erwarteten Format entspricht
+    """
+
+    try:
+        wav_file = wave.open(io.BytesIO(wav_bytes), 'rb')
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Invalid WAV data: {e}") from e
+
+    with wav_file:
+        sample_rate = wav_file.getframerate()
+        num_channels = wav_file.getnchannels()
+        if wav_file.getsampwidth() != PCM_SAMPLE_WIDTH:
+            raise ValueError(f"Unsupported WAV sample width: {wav_file.getsampwidth() * 8} bit")
+        if expected_sample_rate is not None and sample_rate != expected_sample_rate:
+            raise ValueError(f"WAV sample rate {sample_rate} does not match declared {expected_sample_rate}")
+        if expected_channels is not None and num_channels != expected_channels:
+            raise ValueError(f"WAV channels {num_channels} do not match declared {expected_channels}")
+        pcm_data = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+    if num_channels > 1:
+        pcm_data = pcm_data[::num_channels]
+
+    if sample_rate != target_sample_rate:
+        factor = target_sample_rate / sample_rate
+        pcm_data = resample(pcm_data, int(len(pcm_data) * factor)).astype(np.int16)
+
+    return pcm_data
@@ -0,0 +1,417 @@
+"""
+Benchmark for the speaker identification of the relay.
+
+Usage:
+    python src/benchmark_speaker_id.py <corpus> [--backend eagle|fake] [--speakers N] [--json report.json]
+
+The corpus is a directory with one subdirectory per speaker containing WAV files:
+
+    corpus/
+      alice/001.wav, 002.wav, ...
+      bob/001.wav, ...
+
+- The first N speakers (sorted by name, default: all but the last) are enrolled with their
+  utterances in order until the profiler reports 100%, the remaining utterances are genuine trials
+- Speakers that are not enrolled only provide impostor trials
+- Every trial is replayed in the chunk size the relay receives (default 16kb, ~0.5s) and a
+  decision is taken after each chunk, like upload_audio_chunk does
+
+Reported metrics:
+- enrollment: audio seconds needed until the profile is complete
+- latency: audio seconds from the start of an utterance until the correct user is identified
+- throughput: frames/s per core (frames processed per CPU second)
+- false accept rate: impostor trials that are identified as an enrolled user
+- misidentification rate: genuine trials that are identified as another enrolled user
+- false reject rate: genuine trials without any decision (user falls through to enrollment)
+- memory per profile: size of the exported speaker profile
+
+The fake backend is deterministic and needs no Picovoice key, so the harness can run in CI.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from audio_utils import PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, convert_wav_bytes_to_pcm
+from speaker_id_config import IDENTIFICATION_THRESHOLD
+
+load_dotenv() # load environment variables from .env file
+
+DEFAULT_CHUNK_BYTES = 16000
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, IDENTIFICATION_THRESHOLD, 0.95]
+
+
+class EagleBackend:
+    """Scores with Picovoice Eagle, exactly as the relay does."""
+
+    name = "eagle"
+
+    def __init__(self, access_key: str = None):
+        import pveagle  # only needed for this backend, the fake backend runs without it
+
+        self._pveagle = pveagle
+        self.access_key = access_key if access_key is not None else os.getenv("EAGLE_KEY")
+
+    def create_profiler(self):
+        return self._pveagle.create_profiler(access_key=self.access_key)
+
+    def create_recognizer(self, profiles: list):
+        return self._pveagle.create_recognizer(access_key=self.access_key, speaker_profiles=profiles)
+
+    def profile_size(self, profile) -> int:
+        return len(profile.to_bytes())
+
+
+class FakeBackend:
+    """
+    Deterministic stand-in for Eagle with the same profiler/recognizer interface.
+
+    A profile is the mean log band energy of the enrollment audio, the score of a profile is the
+    cosine similarity between it and a smoothed band energy of the processed frames.
+
+    :param enroll_seconds: audio seconds until enrollment reports 100%
+    """
+
+    name = "fake"
+
+    def __init__(self, enroll_seconds: float = 4.0):
+        self.enroll_seconds = enroll_seconds
+
+    def create_profiler(self):
+        return _FakeProfiler(self.enroll_seconds)
+
+    def create_recognizer(self, profiles: list):
+        return _FakeRecognizer(profiles)
+
+    def profile_size(self, profile) -> int:
+        return profile.nbytes
+
+
+FAKE_FRAME_LENGTH = 512
+FAKE_NUM_BANDS = 16
+
+
+def _band_energies(pcm_data: np.ndarray) -> np.ndarray:
+    """Log energy in FAKE_NUM_BANDS frequency bands for every full frame of pcm_data."""
+    num_frames = len(pcm_data) // FAKE_FRAME_LENGTH
+    frames = pcm_data[:num_frames * FAKE_FRAME_LENGTH].reshape(num_frames, FAKE_FRAME_LENGTH).astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    bands = np.array_split(spectrum[:, 1:], FAKE_NUM_BANDS, axis=1)
+    energies = np.log1p(np.stack([band.sum(axis=1) for band in bands], axis=1))
+    return energies - energies.mean(axis=1, keepdims=True)
+
+
+class _FakeProfiler:
+
+    frame_length = FAKE_FRAME_LENGTH
+    min_enroll_samples = FAKE_FRAME_LENGTH
+
+    def __init__(self, enroll_seconds: float):
+        self._required_frames = max(1, int(enroll_seconds * PCM_SAMPLE_RATE / FAKE_FRAME_LENGTH))
+        self._sum = np.zeros(FAKE_NUM_BANDS)
+        self._frames = 0
+
+    def enroll(self, pcm_data: np.ndarray):
+        energies = _band_energies(pcm_data)
+        self._sum += energies.sum(axis=0)
+        self._frames += len(energies)
+        return min(100.0, 100.0 * self._frames / self._required_frames), None
+
+    def export(self) -> np.ndarray:
+        profile = self._sum / max(self._frames, 1)
+        return (profile / (np.linalg.norm(profile) or 1.0)).astype(np.float32)
+
+    def delete(self):
+        pass
+
+
+class _FakeRecognizer:
+
+    frame_length = FAKE_FRAME_LENGTH
+    smoothing = 0.05
+
+    def __init__(self, profiles: list):
+        self._profiles = np.stack(profiles).astype(np.float64)
+        self.reset()
+
+    def process(self, pcm_frame: np.ndarray) -> list[float]:
+        energies = _band_energies(pcm_frame)[0]
+        if self._state is None:
+            self._state = energies
+        else:
+            self._state = (1 - self.smoothing) * self._state + self.smoothing * energies
+        norm = np.linalg.norm(self._state) or 1.0
+        return np.clip(self._profiles @ (self._state / norm), 0.0, 1.0).tolist()
+
+    def reset(self):
+        self._state = None
+
+    def delete(self):
+        pass
+
+
+BACKENDS = {
+    EagleBackend.name: EagleBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def load_corpus(corpus_dir: str) -> dict[str, list[np.ndarray]]:
+    """
+    Reads all WAV files of the corpus and converts them like a WAV upload of the relay.
+
+    :param corpus_dir: directory with one subdirectory of WAV files per speaker
+    :return: (speaker, list of 16 kHz mono int16 PCM utterances), sorted by speaker and file name
+    """
+    corpus = {}
+    for speaker in sorted(os.listdir(corpus_dir)):
+        speaker_dir = os.path.join(corpus_dir, speaker)
+        if not os.path.isdir(speaker_dir):
+            continue
+        utterances = []
+        for file_name in sorted(os.listdir(speaker_dir)):
+            if not file_name.lower().endswith(".wav"):
+                continue
+            with open(os.path.join(speaker_dir, file_name), "rb") as f:
+                utterances.append(convert_wav_bytes_to_pcm(f.read()))
+        if utterances:
+            corpus[speaker] = utterances
+    return corpus
+
+
+def enroll(backend, utterances: list[np.ndarray], chunk_samples: int):
+    """
+    Enrolls one speaker with its utterances in order until the profile is complete.
+
+    :return: (profile or None, enrollment audio seconds, number of utterances used)
+    """
+    profiler = backend.create_profiler()
+    try:
+        step = max(chunk_samples, profiler.min_enroll_samples)
+        pending = np.zeros(0, dtype=np.int16)
+        enrolled_samples = 0
+        for used, pcm_data in enumerate(utterances, start=1):
+            pending = np.concatenate((pending, pcm_data))
+            while len(pending) >= step:
+                percentage, _ = profiler.enroll(pending[:step])
+                enrolled_samples += step
+                pending = pending[step:]
+                if percentage >= 100.0:
+                    return profiler.export(), enrolled_samples / PCM_SAMPLE_RATE, used
+        return None, enrolled_samples / PCM_SAMPLE_RATE, len(utterances)
+    finally:
+        profiler.delete()
+
+
+def replay(recognizer, pcm_data: np.ndarray, chunk_samples: int):
+    """
+    Streams one utterance through the recognizer in relay-sized chunks.
+
+    The relay rescores the whole buffer from a fresh recognizer after every chunk. Scores are
+    deterministic, so that yields the same per-frame scores as one continuous stream, but a
+    decision can only be taken once the chunk containing the frame has arrived.
+
+    :return: (max score per frame, best profile index per frame, audio seconds at decision per frame, CPU seconds)
+    """
+    recognizer.reset()
+    frame_length = recognizer.frame_length
+    max_scores, best_indices, decision_times = [], [], []
+    cpu_seconds = 0.0
+
+    num_frames = len(pcm_data) // frame_length
+    for frame_index in range(num_frames):
+        frame = pcm_data[frame_index * frame_length:(frame_index + 1) * frame_length]
+
+        start = time.process_time()
+        scores = recognizer.process(frame)
+        cpu_seconds += time.process_time() - start
+
+        frame_end = (frame_index + 1) * frame_length
+        chunk_end = min(-(-frame_end // chunk_samples) * chunk_samples, len(pcm_data))
+        max_scores.append(max(scores))
+        best_indices.append(int(np.argmax(scores)))
+        decision_times.append(chunk_end / PCM_SAMPLE_RATE)
+
+    return np.array(max_scores), np.array(best_indices, dtype=int), np.array(decision_times), cpu_seconds
+
+
+def evaluate(trials: list, enrolled_speakers: list[str], thresholds: list[float]) -> list[dict]:
+    """
+    Takes the relay decision (first frame with a score above the threshold) for every trial.
+
+    :param trials: (true speaker, max scores, best indices, decision times) per utterance
+    :param enrolled_speakers: speaker of each profile index
+    :param thresholds: thresholds to evaluate
+    :return: metrics per threshold
+    """
+    results = []
+    for threshold in thresholds:
+        genuine = impostor = correct = false_accepts = misidentifications = false_rejects = 0
+        latencies = []
+        for speaker, max_scores, best_indices, decision_times in trials:
+            is_genuine = speaker in enrolled_speakers
+            genuine += is_genuine
+            impostor += not is_genuine
+
+            above = np.flatnonzero(max_scores > threshold)
+            if len(above) == 0:
+                false_rejects += is_genuine
+                continue
+
+            decided = enrolled_speakers[best_indices[above[0]]]
+            if not is_genuine:
+                false_accepts += 1
+            elif decided == speaker:
+                correct += 1
+                latencies.append(decision_times[above[0]])
+            else:
+                misidentifications += 1
+
+        results.append({
+            "threshold": threshold,
+            "genuine_trials": genuine,
+            "impostor_trials": impostor,
+            "correct": correct,
+            "false_accept_rate": false_accepts / impostor if impostor else None,
+            "misidentification_rate": misidentifications / genuine if genuine else None,
+            "false_reject_rate": false_rejects / genuine if genuine else None,
+            "latency_median_s": float(np.median(latencies)) if latencies else None,
+            "latency_p90_s": float(np.percentile(latencies, 90)) if latencies else None,
+        })
+    return results
+
+
+def run_benchmark(backend, corpus: dict[str, list[np.ndarray]], num_speakers: int = None,
+                  chunk_bytes: int = DEFAULT_CHUNK_BYTES, thresholds: list[float] = DEFAULT_THRESHOLDS) -> dict:
+    """
+    Enrolls num_speakers speakers of the corpus, replays all other utterances and collects the metrics.
+
+    :param backend: EagleBackend, FakeBackend or any object with the same interface
+    :param corpus: output of load_corpus
+    :param num_speakers: number of speakers to enroll, None for all but the last one
+    :param chunk_bytes: size of an uploaded audio chunk in bytes (16 kHz mono 16-bit)
+    :param thresholds: thresholds to evaluate
+    :return: report as dict
+    """
+    if chunk_bytes < PCM_SAMPLE_WIDTH:
+        raise ValueError(f"chunk_bytes must be at least {PCM_SAMPLE_WIDTH}, one 16-bit sample")
+    chunk_samples = chunk_bytes // PCM_SAMPLE_WIDTH
+    speakers = list(corpus)
+    if num_speakers is None:
+        num_speakers = max(len(speakers) - 1, 1)
+    if num_speakers >= len(speakers):
+        print("All speakers are enrolled, there are no impostor trials for the false accept rate", file=sys.stderr)
+
+    profiles, enrolled_speakers, enrollment_seconds, profile_sizes = [], [], [], []
+    test_utterances = []
+    for index, speaker in enumerate(speakers):
+        utterances = corpus[speaker]
+        if index >= num_speakers:
+            test_utterances += [(speaker, pcm_data) for pcm_data in utterances]
+            continue
+
+        profile, seconds, used = enroll(backend, utterances, chunk_samples)
+        if profile is None:
+            print(f"Enrollment of {speaker} incomplete after {seconds:.1f}s of audio, skipped", file=sys.stderr)
+            continue
+        profiles.append(profile)
+        enrolled_speakers.append(speaker)
+        enrollment_seconds.append(seconds)
+        profile_sizes.append(backend.profile_size(profile))
+        test_utterances += [(speaker, pcm_data) for pcm_data in utterances[used:]]
+
+    if not profiles:
+        raise ValueError("No speaker could be enrolled, the corpus needs more audio per speaker")
+
+    recognizer = backend.create_recognizer(profiles)
+    trials = []
+    frames = 0
+    cpu_seconds = 0.0
+    try:
+        frame_length = recognizer.frame_length
+        for speaker, pcm_data in test_utterances:
+            max_scores, best_indices, decision_times, trial_cpu_seconds = replay(recognizer, pcm_data, chunk_samples)
+            trials.append((speaker, max_scores, best_indices, decision_times))
+            frames += len(max_scores)
+            cpu_seconds += trial_cpu_seconds
+    finally:
+        recognizer.delete()
+
+    return {
+        "backend": backend.name,
+        "chunk_bytes": chunk_bytes,
+        "enrolled_speakers": len(enrolled_speakers),
+        "trials": len(trials),
+        "enrollment_seconds_mean": float(np.mean(enrollment_seconds)),
+        "enrollment_seconds_max": float(np.max(enrollment_seconds)),
+        "profile_bytes_mean": float(np.mean(profile_sizes)),
+        "frames": frames,
+        "frames_per_cpu_second": frames / cpu_seconds if cpu_seconds > 0 else None,
+        "realtime_factor": frames * frame_length / PCM_SAMPLE_RATE / cpu_seconds if cpu_seconds > 0 else None,
+        "thresholds": evaluate(trials, enrolled_speakers, thresholds),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"backend: {report['backend']}, chunk: {report['chunk_bytes']} bytes, "
+          f"enrolled speakers: {report['enrolled_speakers']}, trials: {report['trials']}")
+    print(f"enrollment: {report['enrollment_seconds_mean']:.2f}s mean, {report['enrollment_seconds_max']:.2f}s max")
+    print(f"memory per profile: {report['profile_bytes_mean']:.0f} bytes")
+    if report["frames_per_cpu_second"] is not None:
+        print(f"throughput: {report['frames_per_cpu_second']:.0f} frames/s per core "
+              f"({report['realtime_factor']:.1f}x realtime)")
+    print()
+    print(f"{'threshold':>9} {'FAR':>7} {'misID':>7} {'FRR':>7} {'latency p50':>12} {'latency p90':>12}")
+    for row in report["thresholds"]:
+        far = _format_optional(row["false_accept_rate"], "{:.3f}")
+        misidentification = _format_optional(row["misidentification_rate"], "{:.3f}")
+        frr = _format_optional(row["false_reject_rate"], "{:.3f}")
+        p50 = _format_optional(row["latency_median_s"], "{:.2f}s")
+        p90 = _format_optional(row["latency_p90_s"], "{:.2f}s")
+        print(f"{row['threshold']:>9.2f} {far:>7} {misidentification:>7} {frr:>7} {p50:>12} {p90:>12}")
+
+
+def _format_optional(value, template: str) -> str:
+    return template.format(value) if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the speaker identification of the relay.")
+    parser.add_argument("corpus", help="directory with one subdirectory of WAV files per speaker")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=EagleBackend.name)
+    parser.add_argument("--speakers", type=int, default=None,
+                        help="number of speakers to enroll, the others are impostors (default: all but one)")
+    parser.add_argument("--chunk-bytes", type=int, default=DEFAULT_CHUNK_BYTES,
+                        help="size of an uploaded audio chunk in bytes (default: %(default)s, ~0.5s)")
+    parser.add_argument("--thresholds", default=",".join(str(t) for t in DEFAULT_THRESHOLDS),
+                        help="comma separated score thresholds (default: %(default)s)")
+    parser.add_argument("--fake-enroll-seconds", type=float, default=4.0,
+                        help="audio seconds the fake backend needs for enrollment (default: %(default)s)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.backend == FakeBackend.name:
+        backend = FakeBackend(enroll_seconds=args.fake_enroll_seconds)
+    else:
+        backend = EagleBackend()
+
+    corpus = load_corpus(args.corpus)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    try:
+        report = run_benchmark(backend, corpus, args.speakers, args.chunk_bytes, thresholds)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import atexit
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_operations import get_connection, upsert_chat_sessions, get_user_id_by_chat_session
+
+UNKNOWN_USER = -1
+
+
+class ChatSessionRegistry:
+    """
+    Maps chat_session_id -> user_id (or UNKNOWN_USER).
+
+    - Keeps at most `max_size` entries in memory, evicting the least recently used
+    - Entries not accessed for `ttl_seconds` are dropped from memory
+    - Identified users are written to SQLite in the background every `flush_interval` seconds
+    - On a cache miss the mapping is looked up in SQLite, so it survives restarts
+    - At most `max_pending` mappings wait for the database, if it stays unreachable the oldest are dropped
+
+    :param db_path: path of the SQLite database
+    :param max_size: maximum number of chat sessions held in memory
+    :param ttl_seconds: idle time after which an entry is dropped from memory
+    :param flush_interval: seconds between two write-behind flushes
+    :param max_pending: maximum number of mappings waiting for the database, defaults to max_size
+    """
+
+    def __init__(self, db_path: str, max_size: int = 10000, ttl_seconds: float = 3600.0,
+                 flush_interval: float = 5.0, max_pending: int = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.max_pending = max_pending if max_pending is not None else max_size
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+
+        self._entries = OrderedDict()  # (chat session, (user_id, last access))
+        self._pending = OrderedDict()  # (chat session, user_id) not yet written to the database
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def get(self, chat_session_id: str):
+        """Return the user_id of a chat session, or UNKNOWN_USER if it is not identified yet."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(chat_session_id)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._entries[chat_session_id] = (entry[0], now)
+                self._entries.move_to_end(chat_session_id)
+                return entry[0]
+            if chat_session_id in self._pending:
+                user_id = self._pending[chat_session_id]
+                self._store(chat_session_id, user_id, now)
+                return user_id
+
+        user_id = self._load(chat_session_id)
+
+        with self._lock:
+            # a set() may have happened while we were reading the database
+            entry = self._entries.get(chat_session_id)
+            if entry is not None and entry[0] != UNKNOWN_USER:
+                return entry[0]
+            self._store(chat_session_id, user_id, now)
+        return user_id
+
+    def set(self, chat_session_id: str, user_id) -> None:
+        """Map a chat session to a user_id. Identified users are persisted by the next flush."""
+        with self._lock:
+            self._store(chat_session_id, user_id, time.monotonic())
+            if user_id != UNKNOWN_USER:
+                self._pending[chat_session_id] = user_id
+                self._pending.move_to_end(chat_session_id)
+                if len(self._pending) > self.max_pending:
+                    dropped_id, _ = self._pending.popitem(last=False)
+                    print(f"Chat session {dropped_id} dropped before it was written to the database")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def flush(self) -> None:
+        """Write all pending mappings to the database."""
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return
+
+            try:
+                conn: sqlite3.Connection = get_connection(self.db_path)
+                try:
+                    upsert_chat_sessions(conn, batch)
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                return  # keep the batch pending, it is retried on the next flush
+
+            with self._lock:
+                for chat_session_id, user_id in batch.items():
+                    if self._pending.get(chat_session_id) == user_id:
+                        del self._pending[chat_session_id]
+
+    def close(self) -> None:
+        """Stop the background flusher and write what is still pending."""
+        self._stop.set()
+        self.flush()
+
+    def _store(self, chat_session_id: str, user_id, now: float) -> None:
+        # must be called with self._lock held
+        self._entries[chat_session_id] = (user_id, now)
+        self._entries.move_to_end(chat_session_id)
+
+        while self._entries:
+            oldest_id, (_, last_access) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and now - last_access <= self.ttl_seconds:
+                break
+            # pending entries stay in self._pending until flushed, so nothing is lost
+            self._entries.popitem(last=False)
+
+    def _load(self, chat_session_id: str):
+        conn: sqlite3.Connection = get_connection(self.db_path)
+        try:
+            user_id = get_user_id_by_chat_session(conn, chat_session_id)
+        finally:
+            conn.close()
+        return user_id if user_id is not None else UNKNOWN_USER
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
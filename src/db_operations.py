@@ -30,6 +30,14 @@ def get_connection(db_path: str) -> sqlite3.Connection:
                 profile_data BLOB NOT NULL
             )
         ''')
+
+    c.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                chat_session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
     
     conn.commit()
     return conn
@@ -107,4 +115,37 @@ def fetch_all_profiles(conn: sqlite3.Connection) -> dict[str, EagleProfile]:
         return profiles
 
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
\ No newline at end of file
+        print(f"Database error: {e}")
+
+def upsert_chat_sessions(conn: sqlite3.Connection, mappings: dict[str, str]) -> None:
+    """Insert or update the user_id of several chat sessions in one transaction."""
+    c = conn.cursor()
+
+    try:
+
+        c.executemany("""
+            INSERT OR REPLACE INTO chat_sessions (chat_session_id, user_id)
+            VALUES (?, ?)
+        """, list(mappings.items()))
+        conn.commit()
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        raise
+
+def get_user_id_by_chat_session(conn: sqlite3.Connection, chat_session_id: str) -> Optional[str]:
+    """Retrieve the user_id a chat session was mapped to, if any."""
+    c = conn.cursor()
+
+    try:
+        c.execute(
+            "SELECT user_id FROM chat_sessions WHERE chat_session_id = ?",
+            (chat_session_id,)
+        )
+
+        row = c.fetchone()
+        return row[0] if row else None
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return None
@@ -7,7 +7,11 @@ import uuid
 
 from dotenv import load_dotenv
 
+import numpy as np
+
+from audio_utils import convert_wav_bytes_to_pcm, PCM_SAMPLE_RATE, PCM_CHANNELS, PCM_SAMPLE_WIDTH
 from user_identification import identify_speaker, enroll_speaker
+from chat_session_registry import ChatSessionRegistry, UNKNOWN_USER
 
 load_dotenv() # load environment variables from .env file
 
@@ -27,6 +31,13 @@ AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY_2")
 AZURE_SPEECH_REGION = "switzerlandnorth"
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 
+CHAT_SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "10000"))
+CHAT_SESSION_TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+CHAT_SESSION_FLUSH_INTERVAL = float(os.getenv("CHAT_SESSION_FLUSH_INTERVAL", "5"))
+
+MAX_AUDIO_CHUNK_BYTES = int(os.getenv("MAX_AUDIO_CHUNK_BYTES", str(1024 * 1024)))
+READ_PIECE_BYTES = 64 * 1024
+
 client = OpenAI(api_key=OPENAI_KEY)
 
 app = Flask(__name__)
@@ -36,7 +47,12 @@ swagger = Swagger(app)
 
 sessions = {}
 
-chat_sessions = {} # (chat session, user_id)
+chat_sessions = ChatSessionRegistry(
+    db_path,
+    max_size=CHAT_SESSION_CACHE_SIZE,
+    ttl_seconds=CHAT_SESSION_TTL_SECONDS,
+    flush_interval=CHAT_SESSION_FLUSH_INTERVAL,
+) # (chat session, user_id)
 eagle_profiles = {}
 conn: sqlite3.Connection = get_connection(db_path)
 try:
@@ -69,6 +85,23 @@ def open_session(chat_session_id):
             language:
               type: string
               description: Language code for speech recognition (e.g., en-US)
+            audio_format:
+              type: object
+              description: Format of the uploaded audio chunks. Defaults to WAV.
+              properties:
+                encoding:
+                  type: string
+                  enum: [wav, pcm]
+                  description: wav (every chunk is a WAV file) or pcm (raw little-endian samples, no header)
+                sample_rate:
+                  type: integer
+                  description: Sample rate in Hz, must be 16000 for pcm
+                channels:
+                  type: integer
+                  description: Number of channels, must be 1 for pcm
+                bits_per_sample:
+                  type: integer
+                  description: Bits per sample, must be 16
     responses:
       200:
         description: Session created successfully
@@ -79,7 +112,7 @@ def open_session(chat_session_id):
               type: string
               description: Unique identifier for the voice recognition session
       400:
-        description: Language parameter missing
+        description: Language parameter missing or unsupported audio format
         schema:
           type: object
           properties:
@@ -89,26 +122,28 @@ def open_session(chat_session_id):
     """
     session_id = str(uuid.uuid4())
 
-    user_unknown = False
-    if chat_session_id not in chat_sessions:
-        chat_sessions[chat_session_id] = -1
-    if chat_sessions[chat_session_id] == -1:
-        user_unknown = True
+    user_unknown = chat_sessions.get(chat_session_id) == UNKNOWN_USER
 
     body = request.get_json()
     if "language" not in body:
         return jsonify({"error": "Language not specified"}), 400
     language = body["language"]
 
+    audio_format, error = parse_audio_format(body.get("audio_format"))
+    if error:
+        return jsonify({"error": error}), 400
+
     speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
     speech_config.speech_recognition_language = language
-    audio_format = speechsdk.audio.AudioStreamFormat(samples_per_second=16000, bits_per_sample=16, channels=1)
-    audio_input = speechsdk.audio.PushAudioInputStream(stream_format=audio_format)
+    stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=PCM_SAMPLE_RATE, bits_per_sample=PCM_SAMPLE_WIDTH * 8, channels=PCM_CHANNELS)
+    audio_input = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
     audio_config = speechsdk.audio.AudioConfig(stream=audio_input)
     recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
 
     session_data = {
-        "audio_buffer": None,
+        "audio_buffer": bytearray(),  # 16 kHz mono 16-bit PCM
+        "audio_format": audio_format,
+        "lock": threading.Lock(),
         "chatSessionId": chat_session_id,
         "language": language,
         "websocket": None,  # will be set when the client connects via WS
@@ -133,8 +168,9 @@ def open_session(chat_session_id):
 @app.route("/chats/<chat_session_id>/sessions/<session_id>/wav", methods=["POST"])
 def upload_audio_chunk(chat_session_id, session_id):
     """
-    Upload an audio chunk (expected 16kb, ~0.5s of WAV data).
+    Upload an audio chunk (expected 16kb, ~0.5s of audio).
     The chunk is appended to the push stream for the session.
+    Depending on the audio_format of the session it is a WAV file or raw 16 kHz mono 16-bit PCM.
     ---
     tags:
       - Sessions
@@ -155,7 +191,7 @@ def upload_audio_chunk(chat_session_id, session_id):
         schema:
           type: string
           format: binary
-          description: Raw WAV audio data
+          description: WAV file or raw PCM audio data
     responses:
       200:
         description: Audio chunk received successfully
@@ -165,6 +201,14 @@ def upload_audio_chunk(chat_session_id, session_id):
             status:
               type: string
               description: Status message
+      400:
+        description: Audio chunk does not match the audio format of the session
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              description: Description of the error
       404:
         description: Session not found
         schema:
@@ -176,29 +220,135 @@ def upload_audio_chunk(chat_session_id, session_id):
     """
     if session_id not in sessions:
         return jsonify({"error": "Session not found"}), 404
+    session_data = sessions[session_id]
+
+    with session_data["lock"]:
+        audio_buffer = session_data["audio_buffer"]
+        start = len(audio_buffer)
+
+        if session_data["audio_format"]["encoding"] == "pcm":
+            # read the body straight into the session buffer, no decoding needed
+            error, status = read_request_into(audio_buffer)
+            if not error and (len(audio_buffer) - start) % PCM_SAMPLE_WIDTH:
+                error, status = "PCM chunk must contain whole 16-bit samples", 400
+            if error:
+                del audio_buffer[start:]
+                return jsonify({"error": error}), status
+        else:
+            wav_bytes = bytearray()
+            error, status = read_request_into(wav_bytes)
+            if error:
+                return jsonify({"error": error}), status
+            try:
+                pcm_chunk = convert_wav_bytes_to_pcm(
+                    wav_bytes,
+                    expected_sample_rate=session_data["audio_format"]["sample_rate"],
+                    expected_channels=session_data["audio_format"]["channels"],
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            audio_buffer.extend(pcm_chunk.tobytes())
+
+        if session_data["unknown"]:
+            user_id = None
+            if len(eagle_profiles) > 0:
+                pcm_data = np.frombuffer(audio_buffer, dtype=np.int16)  # zero-copy view on the session buffer
+                try:
+                    user_id = identify_speaker(pcm_data, eagle_profiles)
+                except Exception as e:
+                    # handled here so the traceback, which still references the view, is freed right away
+                    print(f"Speaker identification failed: {e}")
+                finally:
+                    del pcm_data  # release the view, otherwise the buffer can't grow
+            if user_id:
+                session_data["unknown"] = False
+                chat_sessions.set(chat_session_id, user_id)
 
-    audio_data = request.get_data()  # raw binary data from the POST body
+        #send audio chunk to azure
+        with memoryview(audio_buffer) as view:
+            session_data["audio_input"].write(bytes(view[start:]))
 
-    if sessions[session_id]["audio_buffer"] is not None:
-        sessions[session_id]["audio_buffer"] = sessions[session_id]["audio_buffer"] + audio_data
-    else:
-        sessions[session_id]["audio_buffer"] = audio_data
+    return jsonify({"status": "audio_chunk_received"})
 
 
-    if sessions[session_id]["unknown"]:
-        user_id = None
-        if len(eagle_profiles) > 0:
-            full_audio_data = sessions[session_id]["audio_buffer"]
-            user_id = identify_speaker(full_audio_data, eagle_profiles)
-        if user_id:
-            sessions[session_id]["unknown"] = False
-            chat_sessions[chat_session_id] = user_id
+def parse_audio_format(audio_format):
+    """
+    Validates the audio_format of an open_session request.
 
+    - pcm must match the Azure push stream exactly (16 kHz, mono, 16-bit)
+    - wav must be 16-bit, a declared sample_rate/channels is checked against every chunk header
 
-    #send audio chunk to azure
-    sessions[session_id]["audio_input"].write(audio_data)
+    :param audio_format: audio_format from the request body, None for the WAV default
+    :return: (audio_format, None) or (None, error message)
+    """
+    if audio_format is None:
+        audio_format = {}
+    if not isinstance(audio_format, dict):
+        return None, "audio_format must be an object"
+
+    encoding = audio_format.get("encoding", "wav")
+    if encoding not in ("wav", "pcm"):
+        return None, f"Unsupported audio encoding: {encoding}"
+
+    expected = {
+        "sample_rate": PCM_SAMPLE_RATE,
+        "channels": PCM_CHANNELS,
+        "bits_per_sample": PCM_SAMPLE_WIDTH * 8,
+    }
+    for name, value in expected.items():
+        declared = audio_format.get(name)
+        if declared is not None and (not isinstance(declared, int) or isinstance(declared, bool) or declared <= 0):
+            return None, f"{name} must be a positive integer"
+        # WAV chunks are resampled/downmixed if needed, only the sample width is fixed
+        if (encoding == "pcm" or name == "bits_per_sample") and declared not in (None, value):
+            return None, f"Unsupported {name} for {encoding}: {declared} (expected {value})"
+
+    return {
+        "encoding": encoding,
+        "sample_rate": audio_format.get("sample_rate"),
+        "channels": audio_format.get("channels"),
+    }, None
+
+
+def read_request_into(buffer: bytearray):
+    """
+    Appends the request body to buffer, reading it in place into the pre-sized tail of buffer.
 
-    return jsonify({"status": "audio_chunk_received"})
+    :param buffer: buffer the body is appended to, left unchanged on error
+    :return: (None, None) or (error message, HTTP status)
+    """
+    length = request.content_length
+    if length is not None and length > MAX_AUDIO_CHUNK_BYTES:
+        return f"Audio chunk larger than {MAX_AUDIO_CHUNK_BYTES} bytes", 413
+
+    start = len(buffer)
+    limit = length if length is not None else MAX_AUDIO_CHUNK_BYTES + 1
+    if length is not None:
+        buffer.extend(bytes(length))  # the declared length is known and bounded, size the tail once
+
+    received = 0
+    try:
+        while received < limit:
+            end = start + received + min(READ_PIECE_BYTES, limit - received)
+            if len(buffer) < end:
+                buffer.extend(bytes(end - len(buffer)))  # unknown length, grow piece by piece
+            with memoryview(buffer) as view, view[start + received:end] as target:
+                n = request.stream.readinto(target)
+            if not n:
+                break
+            received += n
+    except Exception:
+        del buffer[start:]  # e.g. the client disconnected, don't leave a partial chunk behind
+        raise
+    del buffer[start + received:]
+
+    if length is None and received > MAX_AUDIO_CHUNK_BYTES:
+        del buffer[start:]
+        return f"Audio chunk larger than {MAX_AUDIO_CHUNK_BYTES} bytes", 413
+    if length is not None and received < length:
+        del buffer[start:]
+        return f"Incomplete audio chunk: received {received} of {length} bytes", 400
+    return None, None
 
 
 @app.route("/chats/<chat_session_id>/sessions/<session_id>", methods=["DELETE"])
@@ -256,9 +406,11 @@ def close_session(chat_session_id, session_id):
       }
       ws.send(json.dumps(message))
 
-    if sessions[session_id]["audio_buffer"] is not None:
-        audio_data = sessions[session_id]["audio_buffer"]
+    with sessions[session_id]["lock"]:
+        # copy under the lock, a running upload may still grow the buffer
+        audio_data = np.frombuffer(bytes(sessions[session_id]["audio_buffer"]), dtype=np.int16)
 
+    if len(audio_data) > 0:
         if sessions[session_id]["unknown"]:
             user_id, profile = enroll_speaker(chat_session_id, audio_data)
             if profile:
@@ -271,7 +423,7 @@ def close_session(chat_session_id, session_id):
                 finally:
                     conn.close()
 
-                chat_sessions[chat_session_id] = user_id
+                chat_sessions.set(chat_session_id, user_id)
     def delayed_session_cleanup(session_id):
         time.sleep(5)  # 5 Sekunden warten
         sessions.pop(session_id, None)  # Session entfernen
@@ -370,11 +522,9 @@ def set_memories(chat_session_id):
     """
     chat_history = request.get_json()
 
-    if chat_session_id not in chat_sessions:
-        return jsonify({"success": "1"})
-    if chat_sessions[chat_session_id] == -1:
+    user_id = chat_sessions.get(chat_session_id)
+    if user_id == UNKNOWN_USER:
         return jsonify({"success": "1"})
-    user_id = chat_sessions[chat_session_id]
 
     conn: sqlite3.Connection = get_connection(db_path)
 
@@ -450,11 +600,9 @@ def get_memories(chat_session_id):
         description: Chat session not found.
     """
 
-    if chat_session_id not in chat_sessions:
-        return jsonify({"memories": "No memories yet!"})
-    if chat_sessions[chat_session_id] == -1:
+    user_id = chat_sessions.get(chat_session_id)
+    if user_id == UNKNOWN_USER:
         return jsonify({"memories": "No memories yet!"})
-    user_id = chat_sessions[chat_session_id]
 
     conn: sqlite3.Connection = get_connection(db_path)
     try:
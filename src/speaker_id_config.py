@@ -0,0 +1,2 @@
+# Mindest-Score von Eagle, ab dem ein Sprecher als erkannt gilt
+IDENTIFICATION_THRESHOLD = 0.9
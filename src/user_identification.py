@@ -1,17 +1,16 @@
-import io
 import os
 import uuid
-import wave
 
 import numpy as np
 import pveagle
-from scipy.signal import resample
+
+from speaker_id_config import IDENTIFICATION_THRESHOLD
 
 EAGLE_KEY = os.getenv("EAGLE_KEY")
 
 enrollment_progress = {}
 
-def identify_speaker(audio_chunk: bytes, eagle_profiles):
+def identify_speaker(pcm_data: np.ndarray, eagle_profiles):
 
     # Eagle Erkennung
     try:
@@ -21,35 +20,32 @@ def identify_speaker(audio_chunk: bytes, eagle_profiles):
         return None
 
     try:
-        resampled_chunk = convert_wav_bytes_to_pcm(audio_chunk)
-    except Exception:
-        print("Fehler konvertierung")
-        return None
-
-    for i in range(0, len(resampled_chunk), eagle.frame_length):
-        chunk = resampled_chunk[i:i + eagle.frame_length]  # Schneide 512 Samples aus
-
-        if len(chunk) < eagle.frame_length:
-            print(f"Warnung: Letzter Chunk hat nur {len(chunk)} statt {eagle.frame_length} Samples. Wird ignoriert.")
-            break  # Verlasse die Schleife, da der letzte Chunk zu klein ist
-
-        scores = eagle.process(chunk)  # Sende den Chunk an Eagle
-        print(f"Verarbeitetes Chunk {i // eagle.frame_length + 1}: {scores}")
+        for i in range(0, len(pcm_data), eagle.frame_length):
+            chunk = pcm_data[i:i + eagle.frame_length]  # Schneide 512 Samples aus
+
+            if len(chunk) < eagle.frame_length:
+                print(f"Warnung: Letzter Chunk hat nur {len(chunk)} statt {eagle.frame_length} Samples. Wird ignoriert.")
+                break  # Verlasse die Schleife, da der letzte Chunk zu klein ist
+
+            scores = eagle.process(chunk)  # Sende den Chunk an Eagle
+            print(f"Verarbeitetes Chunk {i // eagle.frame_length + 1}: {scores}")
+
+            max_score = max(scores)
+            print("eagle scores for chunk" + str(scores))
+            print("max score" + str(max_score))
+            best_match_index = np.argmax(scores)
+            if max_score > IDENTIFICATION_THRESHOLD:
+                user_id = list(eagle_profiles.keys())[best_match_index]
+                print(f"Erkannter Nutzer: {user_id} (Score: {max_score:.2f})")
+                return user_id
+    except pveagle.EagleError as e:
+        print(f"Fehler bei Eagle-Erkennung: {e}")
+    finally:
+        eagle.delete()
 
-        max_score = max(scores)
-        print("eagle scores for chunk" + str(scores))
-        print("max score" + str(max_score))
-        best_match_index = np.argmax(scores)
-        if max_score > 0.9:
-            user_id = list(eagle_profiles.keys())[best_match_index]
-            print(f"Erkannter Nutzer: {user_id} (Score: {max_score:.2f})")
-            return user_id
-
-
-    eagle.delete()
     return None
 
-def enroll_speaker(chat_session_id, audio_chunk: bytes):
+def enroll_speaker(chat_session_id, pcm_data: np.ndarray):
     global enrollment_progress
 
     if chat_session_id not in enrollment_progress:
@@ -57,9 +53,9 @@ def enroll_speaker(chat_session_id, audio_chunk: bytes):
 
     stored_audio, progress = enrollment_progress[chat_session_id]
     if stored_audio is not None:
-        stored_audio = stored_audio + audio_chunk
+        stored_audio = np.concatenate((stored_audio, pcm_data))
     else:
-        stored_audio = audio_chunk
+        stored_audio = np.array(pcm_data, dtype=np.int16)  # copy, pcm_data may be a view on the session buffer
 
     # Eagle Profiler erstellen
     try:
@@ -67,13 +63,8 @@ def enroll_speaker(chat_session_id, audio_chunk: bytes):
     except pveagle.EagleError:
         print("Fehler bei Profiler-Erstellung")
         return None, None
-    try:
-        resampled_audio = convert_wav_bytes_to_pcm(stored_audio)
-    except Exception:
-        print("Fehler konvertierung")
-        return None
     # Enrollment durchführen
-    enroll_percentage, feedback = eagle_profiler.enroll(resampled_audio)
+    enroll_percentage, feedback = eagle_profiler.enroll(stored_audio)
     print(enroll_percentage, feedback)
     enrollment_progress[chat_session_id] = (stored_audio, enroll_percentage)
 
@@ -87,31 +78,3 @@ def enroll_speaker(chat_session_id, audio_chunk: bytes):
         return str(uuid.uuid4()), speaker_profile
 
     return None, None
-
-
-def convert_wav_bytes_to_pcm(wav_bytes, target_sample_rate=16000):
-    """
-    Konvertiert rohe WAV-Bytes in PCM-Format für Eagle.
-
-    - Extrahiert PCM-Daten aus WAV
-    - Falls nötig, wird von 8000 Hz auf 16000 Hz hochskaliert
-    - Gibt 16-bit PCM-Daten als numpy-Array zurück
-
-    :param wav_bytes: WAV-Datei als Bytes
-    :param target_sample_rate: Ziel-Sample-Rate für Eagle (Standard: 16000 Hz)
-    :return: PCM-Daten als numpy-Array (int16)
-    """
-
-    with wave.open(io.BytesIO(wav_bytes), 'rb') as wav_file:
-        sample_rate = wav_file.getframerate()
-        num_channels = wav_file.getnchannels()
-        pcm_data = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
-
-    if num_channels > 1:
-        pcm_data = pcm_data[::num_channels]
-
-    if sample_rate != target_sample_rate:
-        factor = target_sample_rate / sample_rate
-        pcm_data = resample(pcm_data, int(len(pcm_data) * factor)).astype(np.int16)
-
-    return pcm_data
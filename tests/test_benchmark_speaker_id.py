@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+from benchmark_speaker_id import FakeBackend, evaluate, load_corpus, run_benchmark
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+
+
+def write_corpus(corpus_dir, num_speakers: int = 3, num_utterances: int = 4, seconds: float = 2.0):
+    """Every speaker is noise in its own frequency range, so the fake backend can tell them apart."""
+    rng = np.random.default_rng(0)
+    num_samples = int(seconds * 16000)
+    for speaker in range(num_speakers):
+        speaker_dir = corpus_dir / f"speaker{speaker}"
+        speaker_dir.mkdir()
+        for utterance in range(num_utterances):
+            spectrum = np.fft.rfft(rng.normal(0, 3000, num_samples))
+            band = len(spectrum) // num_speakers
+            spectrum[:speaker * band] = 0
+            spectrum[(speaker + 1) * band:] = 0
+            pcm_data = np.fft.irfft(spectrum, num_samples).astype(np.int16)
+            with wave.open(str(speaker_dir / f"{utterance:03}.wav"), "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(16000)
+                wav_file.writeframes(pcm_data.tobytes())
+
+
+def test_run_benchmark_with_fake_backend(tmp_path):
+    write_corpus(tmp_path)
+    corpus = load_corpus(str(tmp_path))
+
+    report = run_benchmark(FakeBackend(enroll_seconds=3.0), corpus, thresholds=[0.5, 0.9])
+
+    assert report["enrolled_speakers"] == 2  # the last speaker is left out as impostor
+    assert report["enrollment_seconds_mean"] >= 3.0
+    assert report["profile_bytes_mean"] == 16 * 4
+    assert report["frames"] > 0
+    assert report["frames_per_cpu_second"] > 0
+    for row in report["thresholds"]:
+        assert row["impostor_trials"] == 4
+        assert row["genuine_trials"] == 4
+        assert row["false_accept_rate"] == 0.0
+        assert row["misidentification_rate"] == 0.0
+    assert report["thresholds"][0]["false_reject_rate"] == 0.0
+    assert report["thresholds"][0]["latency_median_s"] == 0.5  # decided after the first 16kb chunk
+
+    # deterministic, so it can be compared across CI runs
+    assert run_benchmark(FakeBackend(enroll_seconds=3.0), corpus, thresholds=[0.5, 0.9])["thresholds"] == report["thresholds"]
+
+
+def test_run_benchmark_rejects_chunk_smaller_than_a_sample(tmp_path):
+    write_corpus(tmp_path, num_utterances=2)
+    corpus = load_corpus(str(tmp_path))
+
+    with pytest.raises(ValueError, match="chunk_bytes"):
+        run_benchmark(FakeBackend(), corpus, chunk_bytes=1)
+
+
+def test_evaluate_separates_false_accepts_and_misidentifications():
+    accepted = (np.array([0.95]), np.array([0]), np.array([0.5]))
+    rejected = (np.array([0.1]), np.array([0]), np.array([0.5]))
+    trials = [
+        ("alice", *accepted),  # correct
+        ("bob", *accepted),  # genuine, but identified as alice
+        ("bob", *rejected),  # genuine, no decision
+        ("mallory", *accepted),  # impostor accepted
+        ("mallory", *accepted),  # impostor accepted
+    ]
+
+    row, = evaluate(trials, ["alice", "bob"], [0.9])
+
+    assert row["false_accept_rate"] == 1.0
+    assert row["misidentification_rate"] == 1 / 3
+    assert row["false_reject_rate"] == 1 / 3
+
+
+def test_evaluate_without_impostors_has_no_false_accept_rate():
+    trials = [("alice", np.array([0.95]), np.array([0]), np.array([0.5]))]
+
+    row, = evaluate(trials, ["alice"], [0.9])
+
+    assert row["false_accept_rate"] is None
+
+
+def test_fake_backend_does_not_need_pveagle():
+    code = "import sys; sys.modules['pveagle'] = None; import benchmark_speaker_id"
+
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,106 @@
+import sqlite3
+import types
+
+import pytest
+
+import chat_session_registry
+from chat_session_registry import ChatSessionRegistry, UNKNOWN_USER
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(chat_session_registry, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "data" / "sqlite_database.db")
+
+
+@pytest.fixture
+def make_registry(db_path):
+    registries = []
+
+    def make_registry(**kwargs):
+        # no background flush during the test, flush() is called explicitly
+        registry = ChatSessionRegistry(db_path, flush_interval=3600, **kwargs)
+        registries.append(registry)
+        return registry
+
+    yield make_registry
+    for registry in registries:
+        registry.close()
+
+
+def test_unknown_chat_session(make_registry):
+    registry = make_registry()
+
+    assert registry.get("chat-1") == UNKNOWN_USER
+
+
+def test_evicts_least_recently_used_at_max_size(make_registry, clock):
+    registry = make_registry(max_size=2)
+    registry.set("chat-1", UNKNOWN_USER)
+    registry.set("chat-2", UNKNOWN_USER)
+    registry.get("chat-1")
+
+    registry.set("chat-3", UNKNOWN_USER)
+
+    assert len(registry) == 2
+    assert "chat-2" not in registry._entries
+    assert list(registry._entries) == ["chat-1", "chat-3"]
+
+
+def test_drops_entries_after_ttl(make_registry, clock):
+    registry = make_registry(ttl_seconds=10)
+    registry.set("chat-1", UNKNOWN_USER)
+
+    clock.now = 11
+    registry.set("chat-2", UNKNOWN_USER)
+
+    assert list(registry._entries) == ["chat-2"]
+
+
+def test_evicted_pending_entry_stays_readable(make_registry, clock):
+    registry = make_registry(max_size=1, max_pending=10)
+    registry.set("chat-1", "user-1")
+    registry.set("chat-2", "user-2")
+
+    assert "chat-1" not in registry._entries
+    assert registry.get("chat-1") == "user-1"
+
+
+def test_flushed_mapping_survives_restart(make_registry, clock):
+    registry = make_registry()
+    registry.set("chat-1", "user-1")
+    registry.set("chat-2", UNKNOWN_USER)
+    registry.flush()
+
+    restarted = make_registry()
+
+    assert restarted.get("chat-1") == "user-1"
+    assert restarted.get("chat-2") == UNKNOWN_USER
+
+
+def test_pending_is_bounded_while_database_fails(make_registry, clock, monkeypatch):
+    def failing_upsert(conn, mappings):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(chat_session_registry, "upsert_chat_sessions", failing_upsert)
+    registry = make_registry(max_pending=2)
+    for i in range(5):
+        registry.set(f"chat-{i}", f"user-{i}")
+        registry.flush()
+
+    assert list(registry._pending) == ["chat-3", "chat-4"]
@@ -0,0 +1,195 @@
+import importlib
+import io
+import os
+import types
+import wave
+
+import numpy as np
+import pytest
+
+
+class FakePushAudioInputStream:
+
+    def __init__(self, stream_format=None):
+        self.written = []
+
+    def write(self, buffer: bytes):
+        self.written.append(buffer)
+
+    def close(self):
+        pass
+
+
+class FakeSpeechRecognizer:
+
+    def __init__(self, speech_config=None, audio_config=None):
+        self.recognized = types.SimpleNamespace(connect=lambda callback: None)
+
+    def start_continuous_recognition(self):
+        pass
+
+    def stop_continuous_recognition(self):
+        pass
+
+
+# stands in for the Azure speech SDK, which needs a key and network access
+fake_speechsdk = types.SimpleNamespace(
+    SpeechConfig=lambda subscription=None, region=None: types.SimpleNamespace(),
+    SpeechRecognizer=FakeSpeechRecognizer,
+    ResultReason=types.SimpleNamespace(RecognizedSpeech="RecognizedSpeech"),
+    audio=types.SimpleNamespace(
+        AudioStreamFormat=lambda samples_per_second, bits_per_sample, channels: object(),
+        PushAudioInputStream=FakePushAudioInputStream,
+        AudioConfig=lambda stream=None: types.SimpleNamespace(),
+    ),
+)
+
+
+@pytest.fixture(scope="module")
+def relay(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("relay"))  # relay creates ./data/sqlite_database.db on import
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    try:
+        module = importlib.import_module("relay")
+        module.speechsdk = fake_speechsdk
+        yield module
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(relay):
+    return relay.app.test_client()
+
+
+def open_session(client, audio_format=None):
+    body = {"language": "en-US"}
+    if audio_format is not None:
+        body["audio_format"] = audio_format
+    response = client.post("/chats/chat-1/sessions", json=body)
+    assert response.status_code == 200
+    return response.get_json()["session_id"]
+
+
+def make_wav(pcm_data: np.ndarray, sample_rate: int = 16000, sample_width: int = 2) -> bytes:
+    data = io.BytesIO()
+    with wave.open(data, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm_data.tobytes())
+    return data.getvalue()
+
+
+def test_upload_pcm_chunk(relay, client):
+    session_id = open_session(client, {"encoding": "pcm"})
+    pcm_data = np.arange(800, dtype=np.int16)
+
+    response = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=pcm_data.tobytes())
+
+    assert response.status_code == 200
+    session_data = relay.sessions[session_id]
+    assert bytes(session_data["audio_buffer"]) == pcm_data.tobytes()
+    assert session_data["audio_input"].written == [pcm_data.tobytes()]
+
+
+def test_upload_wav_chunk(relay, client):
+    session_id = open_session(client)
+    pcm_data = np.arange(800, dtype=np.int16)
+
+    response = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=make_wav(pcm_data))
+
+    assert response.status_code == 200
+    session_data = relay.sessions[session_id]
+    assert bytes(session_data["audio_buffer"]) == pcm_data.tobytes()  # WAV header is stripped
+    assert session_data["audio_input"].written == [pcm_data.tobytes()]
+
+
+def test_open_session_rejects_unsupported_pcm_format(client):
+    response = client.post("/chats/chat-1/sessions", json={
+        "language": "en-US",
+        "audio_format": {"encoding": "pcm", "sample_rate": 8000},
+    })
+
+    assert response.status_code == 400
+
+
+def test_upload_rejects_mismatching_wav_chunk(relay, client):
+    session_id = open_session(client, {"encoding": "wav", "sample_rate": 16000})
+
+    response = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=make_wav(np.zeros(800, dtype=np.int16), 8000))
+
+    assert response.status_code == 400
+    assert len(relay.sessions[session_id]["audio_buffer"]) == 0
+
+
+def test_upload_rejects_too_large_chunk(relay, client, monkeypatch):
+    monkeypatch.setattr(relay, "MAX_AUDIO_CHUNK_BYTES", 100)
+    session_id = open_session(client, {"encoding": "pcm"})
+
+    response = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=bytes(200))
+
+    assert response.status_code == 413
+    assert len(relay.sessions[session_id]["audio_buffer"]) == 0
+
+
+def test_upload_rejects_incomplete_chunk(relay, client):
+    session_id = open_session(client, {"encoding": "pcm"})
+
+    # the client declares 10 bytes but disconnects after 4
+    response = client.post(f"/chats/chat-1/sessions/{session_id}/wav", input_stream=io.BytesIO(bytes(4)),
+                           environ_overrides={"CONTENT_LENGTH": "10"})
+
+    assert response.status_code == 400
+    assert len(relay.sessions[session_id]["audio_buffer"]) == 0
+
+
+class FailingEagle:
+
+    frame_length = 512
+
+    def __init__(self, error_type):
+        self.error_type = error_type
+        self.deleted = False
+
+    def process(self, pcm_frame):
+        raise self.error_type("activation limit reached")
+
+    def delete(self):
+        self.deleted = True
+
+
+def test_upload_after_eagle_error(relay, client, monkeypatch):
+    import user_identification
+
+    eagle = FailingEagle(user_identification.pveagle.EagleError)
+    monkeypatch.setattr(user_identification.pveagle, "create_recognizer", lambda access_key, speaker_profiles: eagle)
+    monkeypatch.setattr(relay, "eagle_profiles", {"user-1": object()})
+    session_id = open_session(client, {"encoding": "pcm"})
+    pcm_data = np.zeros(1024, dtype=np.int16)
+
+    first = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=pcm_data.tobytes())
+    second = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=pcm_data.tobytes())
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert eagle.deleted
+    assert len(relay.sessions[session_id]["audio_buffer"]) == 2 * pcm_data.nbytes
+
+
+def test_upload_after_identify_speaker_raises(relay, client, monkeypatch):
+    def failing_identify_speaker(pcm_data, eagle_profiles):
+        raise RuntimeError("identification failed")
+
+    monkeypatch.setattr(relay, "identify_speaker", failing_identify_speaker)
+    monkeypatch.setattr(relay, "eagle_profiles", {"user-1": object()})
+    session_id = open_session(client, {"encoding": "pcm"})
+    pcm_data = np.zeros(1024, dtype=np.int16)
+
+    first = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=pcm_data.tobytes())
+    second = client.post(f"/chats/chat-1/sessions/{session_id}/wav", data=pcm_data.tobytes())
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert len(relay.sessions[session_id]["audio_buffer"]) == 2 * pcm_data.nbytes